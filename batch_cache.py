@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+On-disk caches for the in-process LatentSync pipeline
+Template videos are reused across many audios, so work that depends only
+on the video (face alignment, VAE encoding) is stored once per video and
+reused by every later audio; audio features are stored once per audio
+file and reused across runs
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Bump when the layout or the face alignment code changes
+FACE_CACHE_VERSION = 1
+
+# Bytes of the video file hashed for its cache key
+DIGEST_HEAD_BYTES = 1 << 20
+
+# Elements skipped between the samples hashed for a tensor's cache key;
+# prime so the samples do not line up with image rows or channels
+DIGEST_SAMPLE_STRIDE = 61
+
+# Face cache entries uploaded ahead of their use: the template being
+# processed plus the ones decoded ahead of it
+FACE_PRELOAD_ENTRIES = 3
+
+
+def video_digest(video_path):
+    """Cheap content key for a video: blake2b of its first 1MB plus its size"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, "rb") as f:
+        digest.update(f.read(DIGEST_HEAD_BYTES))
+    digest.update(str(os.path.getsize(video_path)).encode())
+    return digest.hexdigest()
+
+
+def module_digest(module):
+    """Content key for a model: blake2b over its config and weights"""
+    import torch
+
+    digest = hashlib.blake2b(digest_size=8)
+    config = getattr(module, "config", None)
+    if config is not None:
+        digest.update(json.dumps(dict(config), sort_keys=True, default=str).encode())
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().contiguous().cpu().view(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+def tensor_digest(tensor):
+    """Content key for a tensor: blake2b over its shape, dtype, a strided
+    sample of its elements and the sum of all of them
+
+    The sample and the sum are gathered on the tensor's device, so only
+    about 1/DIGEST_SAMPLE_STRIDE of the data is copied to the host
+    """
+    import torch
+
+    flat = tensor.detach().reshape(-1)
+    sample = flat[::DIGEST_SAMPLE_STRIDE].contiguous().view(torch.uint8)
+    total = flat.sum(dtype=torch.float64).reshape(1).view(torch.uint8)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{tuple(tensor.shape)}|{tensor.dtype}".encode())
+    digest.update(torch.cat([sample, total]).cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _save_npz(path, **arrays):
+    """Write an .npz atomically so concurrent readers never see a partial file"""
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, path)
+
+
+class FaceCache:
+    """Aligned face crops, boxes and affine matrices per template video"""
+
+    def __init__(self, cache_dir, resolution):
+        self.cache_dir = Path(cache_dir) / "face"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.model_version = f"v{FACE_CACHE_VERSION}_{resolution}"
+        self._digests = {}
+        self._last = None
+        self._preloaded = OrderedDict()
+        self._preload_lock = threading.Lock()
+        self._copy_stream = None
+
+    def path_for(self, video_path):
+        """Cache file for a video, keyed by its content and the alignment version"""
+        key = str(video_path)
+        if key not in self._digests:
+            self._digests[key] = video_digest(video_path)
+        return self.cache_dir / f"{self._digests[key]}_{self.model_version}.npz"
+
+    def preload(self, video_path):
+        """Read a video's cache entry ahead of load(), if it exists
+
+        Called from the decode threads: faces that belong on the GPU start
+        their upload there, on a copy stream that overlaps the GPU stage
+        """
+        path = self.path_for(video_path)
+        with self._preload_lock:
+            if path in self._preloaded:
+                self._preloaded.move_to_end(path)
+                return
+        if not path.exists():
+            return
+
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        device = str(arrays["faces_device"])
+        if device.startswith("cuda"):
+            arrays["faces"], arrays["faces_ready"] = self._upload(arrays["faces"], device)
+        with self._preload_lock:
+            self._preloaded[path] = arrays
+            while len(self._preloaded) > FACE_PRELOAD_ENTRIES:
+                self._preloaded.popitem(last=False)
+
+    def _upload(self, array, device):
+        """Start copying an array to the GPU on the copy stream; returns the
+        device tensor and the event recorded after the copy"""
+        import torch
+
+        with self._preload_lock:
+            if self._copy_stream is None:
+                self._copy_stream = torch.cuda.Stream(device=device)
+        with torch.cuda.stream(self._copy_stream):
+            tensor = torch.from_numpy(array).pin_memory().to(device, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(self._copy_stream)
+        return tensor, ready
+
+    def load(self, video_path, num_frames):
+        """Return (faces, boxes, affine_matrices) for the first num_frames frames
+        of a video, or None when the cached alignment does not cover them"""
+        path = self.path_for(video_path)
+        if self._last is None or self._last[0] != path:
+            result = self._read(path)
+            if result is None:
+                return None
+            self._last = (path, result)
+
+        faces, boxes, affine_matrices = self._last[1]
+        if len(faces) < num_frames:
+            return None
+        return faces[:num_frames], boxes[:num_frames], affine_matrices[:num_frames]
+
+    def _read(self, path):
+        import torch
+
+        with self._preload_lock:
+            arrays = self._preloaded.pop(path, None)
+        if arrays is None:
+            if not path.exists():
+                return None
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+
+        ready = arrays.get("faces_ready")
+        if ready is not None:
+            # Uploaded by preload() on the copy stream: order the compute
+            # stream after the copy and keep the memory alive for its use
+            faces = arrays["faces"]
+            stream = torch.cuda.current_stream(faces.device)
+            stream.wait_event(ready)
+            faces.record_stream(stream)
+        else:
+            faces = torch.from_numpy(arrays["faces"]).to(str(arrays["faces_device"]))
+        boxes = arrays["boxes"].tolist()
+        affine_matrices = list(arrays["affines"])
+        if bool(arrays["affines_are_tensors"]):
+            affine_matrices = [torch.from_numpy(m).to(faces.device) for m in affine_matrices]
+        return faces, boxes, affine_matrices
+
+    def save(self, video_path, faces, boxes, affine_matrices):
+        """Store the alignment results of a video, covering all of its frames"""
+        import torch
+
+        affines_are_tensors = torch.is_tensor(affine_matrices[0])
+        if affines_are_tensors:
+            affines = torch.stack([m.detach().cpu() for m in affine_matrices]).numpy()
+        else:
+            affines = np.stack(affine_matrices)
+
+        path = self.path_for(video_path)
+        _save_npz(
+            path,
+            faces=faces.detach().cpu().numpy(),
+            faces_device=np.array(str(faces.device)),
+            boxes=np.asarray(boxes),
+            affines=affines,
+            affines_are_tensors=np.array(affines_are_tensors),
+        )
+        self._last = (path, (faces, boxes, affine_matrices))
+
+
+class AudioFeatureCache:
+    """Whisper features of many audio files in one contiguous file, read back via mmap"""
+
+    def __init__(self, cache_dir, model_version):
+        self.cache_dir = Path(cache_dir) / "audio"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.cache_dir / "features.bin"
+        self.index_path = self.cache_dir / "features.index.json"
+        self.lock_path = self.cache_dir / "features.lock"
+        self.model_version = model_version
+        self.index = self._read_index()
+        self._pending = {}
+
+    @contextmanager
+    def _locked(self):
+        """Serialize appends and index updates between concurrent batch runs"""
+        with open(self.lock_path, "a") as lock:
+            try:
+                import fcntl
+            except ImportError:
+                yield
+                return
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _entry_key(self, audio_path):
+        stat = os.stat(audio_path)
+        return f"{os.path.abspath(audio_path)}|{stat.st_size}|{stat.st_mtime_ns}|{self.model_version}"
+
+    def get(self, audio_path):
+        """Return the cached features of an audio file as a memory map, or None"""
+        entry = self.index.get(self._entry_key(audio_path))
+        if entry is None:
+            return None
+        # Copy-on-write mapping: zero-copy reads, and writes never reach the file
+        return np.memmap(self.data_path, mode="c", dtype=entry["dtype"],
+                         offset=entry["offset"], shape=tuple(entry["shape"]))
+
+    def put(self, audio_path, features):
+        """Append the features of an audio file; visible to get() after flush()"""
+        features = np.ascontiguousarray(features)
+        with self._locked():
+            with open(self.data_path, "ab") as f:
+                offset = f.tell()
+                f.write(features.tobytes())
+        self._pending[self._entry_key(audio_path)] = {
+            "offset": offset,
+            "shape": list(features.shape),
+            "dtype": features.dtype.str,
+        }
+
+    def flush(self):
+        """Merge appended entries into the on-disk index"""
+        if not self._pending:
+            return
+        with self._locked():
+            index = self._read_index()
+            index.update(self._pending)
+            temp_path = self.index_path.with_name(f".{self.index_path.name}.{os.getpid()}.tmp")
+            with open(temp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(temp_path, self.index_path)
+        self.index = index
+        self._pending = {}
+
+
+class LatentCache:
+    """VAE posterior parameters of a template video's face chunks
+
+    Entries are keyed by the content of the images passed to vae.encode, so
+    any chunk of frames seen before for the same video (most chunks, since
+    every audio starts from the first frame) skips the VAE encoder. The
+    posterior is still sampled per call, so results are unchanged.
+    """
+
+    def __init__(self, cache_dir, vae):
+        self.cache_dir = Path(cache_dir) / "latents"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.vae_version = module_digest(vae)
+        self._digests = {}
+        self._path = None
+        self._entries = {}
+        self._dirty = False
+
+    def open(self, video_path):
+        """Switch to the entries of a video, writing back those of the previous one"""
+        key = str(video_path)
+        if key not in self._digests:
+            self._digests[key] = video_digest(video_path)
+        path = self.cache_dir / f"{self._digests[key]}_{self.vae_version}.pt"
+        if path == self._path:
+            return
+
+        import torch
+
+        self.flush()
+        self._path = path
+        self._entries = {}
+        if path.exists():
+            self._entries = torch.load(path, map_location="cuda", weights_only=True)
+
+    def get(self, images):
+        """Return the cached posterior parameters for a batch of images, or None"""
+        if self._path is None:
+            return None
+        parameters = self._entries.get(tensor_digest(images))
+        if parameters is None:
+            return None
+        return parameters.to(images.dtype)
+
+    def put(self, images, parameters):
+        """Remember the posterior parameters computed for a batch of images"""
+        if self._path is None:
+            return
+        # Kept in the VAE's own precision so a hit matches a miss exactly
+        self._entries[tensor_digest(images)] = parameters.detach()
+        self._dirty = True
+
+    def flush(self):
+        """Write the current video's entries back to disk"""
+        import torch
+
+        if not self._dirty:
+            return
+        temp_path = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        torch.save(self._entries, temp_path)
+        os.replace(temp_path, self._path)
+        self._dirty = False
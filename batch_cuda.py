@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+CUDA helpers for the in-process LatentSync pipeline
+Compiles the denoising UNet and captures it into CUDA graphs so each
+diffusion step is a single graph replay instead of hundreds of individual
+kernel launches
+"""
+
+import logging
+
+import torch
+
+log = logging.getLogger(__name__)
+
+# Eager iterations run on a side stream before capturing a graph
+GRAPH_WARMUP_ITERS = 2
+
+# Compiled graphs kept per function before TorchDynamo falls back to eager;
+# the last chunk of each clip can have its own frame count
+COMPILE_CACHE_SIZE = 64
+
+
+def compile_unet(unet, cuda_graphs=False):
+    """Compile the UNet forward with TorchDynamo, one static graph per input shape
+
+    reduce-overhead mode adds its own CUDA graphs, so plain compilation is
+    used when the forward is also captured by CUDAGraphUNet
+    """
+    import torch._dynamo
+
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit,
+                                                COMPILE_CACHE_SIZE)
+    mode = "default" if cuda_graphs else "reduce-overhead"
+    unet.forward = torch.compile(unet.forward, mode=mode, fullgraph=False, dynamic=False)
+
+
+class CUDAGraphUNet:
+    """Replays the UNet forward from CUDA graphs, one graph per input shape
+
+    The first call for a shape runs eagerly; the second captures a graph that
+    every later call with that shape replays. Shapes that cannot be captured
+    (or calls with extra arguments) keep running eagerly.
+    """
+
+    def __init__(self, unet):
+        self.unet = unet
+        self.forward = unet.forward
+        self.pool = torch.cuda.graph_pool_handle()
+        self.graphs = {}
+        self.seen = set()
+        self.eager = set()
+        self.output_type = None
+
+    def install(self):
+        """Route the UNet's forward through the graph cache"""
+        self.unet.forward = self
+
+    def uninstall(self):
+        """Restore the UNet's eager forward"""
+        self.unet.forward = self.forward
+
+    def __call__(self, sample, timestep, encoder_hidden_states=None, return_dict=True, **kwargs):
+        if not torch.is_tensor(timestep):
+            timestep = torch.tensor(timestep, device=sample.device)
+
+        key = (tuple(sample.shape), sample.dtype, tuple(timestep.shape),
+               None if encoder_hidden_states is None else tuple(encoder_hidden_states.shape))
+
+        first_call = key not in self.graphs and key not in self.seen
+        if (kwargs or first_call or key in self.eager
+                or return_dict and self.output_type is None):
+            self.seen.add(key)
+            result = self.forward(sample, timestep, encoder_hidden_states=encoder_hidden_states,
+                                  return_dict=return_dict, **kwargs)
+            if return_dict and self.output_type is None:
+                self.output_type = type(result)
+            return result
+
+        if key not in self.graphs:
+            try:
+                self.graphs[key] = self._capture(sample, timestep, encoder_hidden_states)
+            except RuntimeError as e:
+                log.warning(f"Warning: CUDA graph capture failed for UNet input {key[0]}, "
+                            f"running it eagerly ({e})")
+                self.eager.add(key)
+                return self.forward(sample, timestep, encoder_hidden_states=encoder_hidden_states,
+                                    return_dict=return_dict)
+
+        graph, static_sample, static_timestep, static_cond, static_out = self.graphs[key]
+        static_sample.copy_(sample, non_blocking=True)
+        static_timestep.copy_(timestep, non_blocking=True)
+        if static_cond is not None:
+            static_cond.copy_(encoder_hidden_states, non_blocking=True)
+        graph.replay()
+
+        # The static output is overwritten by the next replay
+        noise_pred = static_out.clone()
+        if not return_dict:
+            return (noise_pred,)
+        return self.output_type(sample=noise_pred)
+
+    def _capture(self, sample, timestep, encoder_hidden_states):
+        static_sample = sample.clone()
+        static_timestep = timestep.clone()
+        static_cond = None if encoder_hidden_states is None else encoder_hidden_states.clone()
+
+        side_stream = torch.cuda.Stream()
+        side_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(side_stream):
+            for _ in range(GRAPH_WARMUP_ITERS):
+                self.forward(static_sample, static_timestep,
+                             encoder_hidden_states=static_cond, return_dict=False)
+        torch.cuda.current_stream().wait_stream(side_stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self.pool):
+            static_out = self.forward(static_sample, static_timestep,
+                                      encoder_hidden_states=static_cond, return_dict=False)[0]
+
+        return graph, static_sample, static_timestep, static_cond, static_out
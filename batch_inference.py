@@ -5,36 +5,82 @@ Iterates through all video templates and audio files to generate lip sync videos
 """
 
 import os
+import io
+import sys
 import argparse
+import logging
 import subprocess
+import threading
 import time
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 import random
-from omegaconf import OmegaConf
-import torch
 
-def get_video_files(video_dir):
-    """Get all video files from the video directory"""
-    video_path = Path(video_dir)
-    video_files = []
+# Number of trailing stderr lines kept from a failed inference subprocess
+STDERR_TAIL_LINES = 200
+
+# Longest time a buffered log message may wait before it is written out
+LOG_FLUSH_INTERVAL = 1.0
+
+# Worker processes seed their RNGs with base_seed * SHARD_SEED_STRIDE + shard
+SHARD_SEED_STRIDE = 1000003
+
+log = logging.getLogger("batch_inference")
+# Per-combination messages, silenced by --quiet
+progress_log = logging.getLogger("batch_inference.progress")
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """StreamHandler that flushes at most once per LOG_FLUSH_INTERVAL"""
     
-    if video_path.exists():
-        for file in video_path.glob("*.mp4"):
-            video_files.append(str(file))
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.last_flush = time.monotonic()
     
-    return sorted(video_files)
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            now = time.monotonic()
+            if record.levelno >= logging.WARNING or now - self.last_flush >= LOG_FLUSH_INTERVAL:
+                self.flush()
+                self.last_flush = now
+        except Exception:
+            self.handleError(record)
+
+def setup_logging(quiet=False):
+    """Log to a block-buffered stdout instead of one write() per print"""
+    stdout = io.TextIOWrapper(os.fdopen(sys.stdout.fileno(), "wb", buffering=8192, closefd=False),
+                              encoding=sys.stdout.encoding or "utf-8", line_buffering=False)
+    logging.basicConfig(level=logging.INFO, format="%(message)s",
+                        handlers=[BufferedStreamHandler(stdout)])
+    if quiet:
+        progress_log.setLevel(logging.WARNING)
+
+def flush_logs():
+    """Write out buffered log messages before blocking on a long wait"""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+def scan_files(directory, extension):
+    """List regular files with the given extension, sorted by name"""
+    # DirEntry carries the file type from the directory listing, so this
+    # avoids the per-file stat of Path.glob (only symlinks are stat-ed)
+    try:
+        with os.scandir(directory) as entries:
+            files = [Path(entry.path) for entry in entries
+                     if entry.name.endswith(extension) and entry.is_file()]
+    except FileNotFoundError:
+        return []
+    
+    return sorted(files, key=lambda p: p.name)
+
+def get_video_files(video_dir):
+    """Get all video files from the video directory"""
+    return scan_files(video_dir, ".mp4")
 
 def get_audio_files(audio_dir):
     """Get all audio files from the audio directory"""
-    audio_path = Path(audio_dir)
-    audio_files = []
-    
-    if audio_path.exists():
-        for file in audio_path.glob("*.wav"):
-            audio_files.append(str(file))
-    
-    return sorted(audio_files)
+    return scan_files(audio_dir, ".wav")
 
 def create_output_dir(output_dir):
     """Create output directory if it doesn't exist"""
@@ -51,12 +97,12 @@ def run_inference(video_path, audio_path, output_path, config_path, ckpt_path,
     
     # Create command
     cmd = [
-        "python", "-m", "scripts.inference",
+        sys.executable, "-m", "scripts.inference",
         "--unet_config_path", config_path,
         "--inference_ckpt_path", ckpt_path,
-        "--video_path", video_path,
-        "--audio_path", audio_path,
-        "--video_out_path", output_path,
+        "--video_path", str(video_path),
+        "--audio_path", str(audio_path),
+        "--video_out_path", str(output_path),
         "--inference_steps", str(inference_steps),
         "--guidance_scale", str(guidance_scale),
         "--seed", str(seed)
@@ -65,22 +111,241 @@ def run_inference(video_path, audio_path, output_path, config_path, ckpt_path,
     if enable_deepcache:
         cmd.append("--enable_deepcache")
     
-    print(f"Running inference for:")
-    print(f"  Video: {Path(video_path).name}")
-    print(f"  Audio: {Path(audio_path).name}")
-    print(f"  Output: {Path(output_path).name}")
-    print(f"  Seed: {seed}")
-    print(f"  Command: {' '.join(cmd)}")
+    progress_log.info(f"Running inference for:\n"
+                      f"  Video: {video_path.name}\n"
+                      f"  Audio: {audio_path.name}\n"
+                      f"  Output: {output_path.name}\n"
+                      f"  Seed: {seed}\n"
+                      f"  Command: {' '.join(cmd)}")
     
-    # Run the command
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print(f"✓ Successfully generated: {Path(output_path).name}")
+    # Run the command, streaming stderr (tqdm progress, errors) to our terminal
+    # and keeping only its tail for diagnostics. A full executable path and
+    # close_fds=False let CPython use posix_spawn instead of forking this process
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               close_fds=False)
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    drain = threading.Thread(target=drain_stderr, args=(process.stderr, stderr_tail), daemon=True)
+    drain.start()
+    flush_logs()
+    returncode = process.wait()
+    drain.join()
+    
+    if returncode == 0:
+        progress_log.info(f"✓ Successfully generated: {output_path.name}")
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ Error generating {Path(output_path).name}:")
-        print(f"  Error: {e.stderr}")
-        return False
+    
+    progress_log.warning(f"✗ Error generating {output_path.name} (exit code {returncode}):\n"
+                         f"  Error: {''.join(stderr_tail)}")
+    return False
+
+def drain_stderr(stream, tail):
+    """Forward a child's stderr to ours while keeping its last lines"""
+    # newline="" splits on \r as well as \n but keeps the line endings, so
+    # tqdm's carriage-return redraws reach the terminal unchanged
+    for line in io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline=""):
+        sys.stderr.write(line)
+        if line.endswith("\r"):
+            # A progress bar redraw: show it now, but keep it out of the tail
+            sys.stderr.flush()
+        else:
+            tail.append(line)
+    stream.close()
+
+def collect_result(future, output_path):
+    """Wait for a queued in-process inference; returns its outcome and report line"""
+    flush_logs()
+    error = future.exception()
+    if error is None:
+        return True, f"✓ Successfully generated: {output_path.name}"
+    return False, f"✗ Error generating {output_path.name}:\n  Error: {error}"
+
+def shuffled_cycle(items):
+    """Yield items in random order, reshuffling after each full pass"""
+    order = list(items)
+    while True:
+        random.shuffle(order)
+        yield from order
+        log.warning("Warning: All videos have been used. Reusing videos.")
+
+def group_by_video(assignments):
+    """Order (video, audio) assignments video-major
+    
+    All audios of a template run back to back, so its caches (decoded
+    frames, face and latent caches, compiled graphs) stay hot instead of
+    being rebuilt on every template switch
+    """
+    # Keep videos in first-seen order so progress follows the sampling order
+    audios_by_video = {}
+    for video, audio in assignments:
+        audios_by_video.setdefault(video, []).append(audio)
+    
+    return [(video, audio) for video, audios in audios_by_video.items() for audio in audios]
+
+def load_pipeline(args, decode_workers=None):
+    """Load the models once and keep them resident; None means use subprocesses"""
+    if args.subprocess:
+        return None
+    try:
+        from batch_pipeline import build_pipeline
+        log.info("Loading LatentSync pipeline...")
+        return build_pipeline(args.config_path, args.ckpt_path,
+                              enable_deepcache=args.enable_deepcache,
+                              decode_workers=decode_workers,
+                              encode_workers=args.encode_workers,
+                              cuda_graphs=args.cuda_graphs,
+                              cache_dir=None if args.no_cache else args.cache_dir,
+                              dtype=args.dtype,
+                              compile_unet=args.compile)
+    except ImportError as e:
+        log.warning(f"Warning: Could not load LatentSync in-process ({e}). "
+                    f"Falling back to one subprocess per combination.")
+        return None
+
+def process_jobs(jobs, args, pipeline, report):
+    """Run (video, audio, output_path, seed, label) jobs, passing each job's
+    outcome and report lines to report()"""
+    # Closing restores the hooks patched into LatentSync and writes back the
+    # latent cache, also when a job raises out of this loop
+    try:
+        if pipeline is not None:
+            job_audio_files = [audio for _, audio, _, _, _ in jobs]
+            log.info("Preparing audio feature cache...")
+            extracted, skipped = pipeline.prepare_audio_cache(job_audio_files)
+            log.info(f"Extracted features for {extracted} audio files "
+                     f"({len(job_audio_files) - extracted - skipped} already cached, "
+                     f"{skipped} unreadable)")
+        
+        # In-process jobs run as three overlapped stages: upcoming templates
+        # are decoded ahead (A), the current job runs on the GPU (B), and the
+        # previous job is still being written out (C)
+        pending = None
+        
+        for index, (sampled_video, audio_file, output_path, seed, label) in enumerate(jobs):
+            progress_log.info(f"\n{label} Processing combination...\n"
+                              f"  Audio: {audio_file.name} -> {output_path.name} (seed {seed})\n"
+                              f"  Randomly selected video: {sampled_video.name}")
+            
+            # Run inference
+            if pipeline is not None:
+                # The current template first, so queueing the upcoming ones
+                # cannot evict it from the prefetch window
+                for upcoming_video, *_ in jobs[index:index + 1 + pipeline.prefetch_depth]:
+                    pipeline.prefetch(upcoming_video)
+                
+                # The GPU stage blocks for the whole clip
+                flush_logs()
+                future = pipeline.submit(
+                    video_path=sampled_video,
+                    audio_path=audio_file,
+                    output_path=output_path,
+                    seed=seed,
+                    inference_steps=args.inference_steps,
+                    guidance_scale=args.guidance_scale
+                )
+                
+                if pending is not None:
+                    success, line = collect_result(*pending)
+                    report([success], [line])
+                pending = (future, output_path)
+            else:
+                report([run_inference(
+                    video_path=sampled_video,
+                    audio_path=audio_file,
+                    output_path=output_path,
+                    config_path=args.config_path,
+                    ckpt_path=args.ckpt_path,
+                    inference_steps=args.inference_steps,
+                    guidance_scale=args.guidance_scale,
+                    seed=seed,
+                    enable_deepcache=args.enable_deepcache
+                )])
+        
+        if pending is not None:
+            success, line = collect_result(*pending)
+            report([success], [line])
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+
+def visible_devices():
+    """GPU ids this run may use, honouring CUDA_VISIBLE_DEVICES"""
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None:
+        return [device.strip() for device in visible.split(",") if device.strip()]
+    try:
+        import torch
+    except ImportError:
+        return []
+    return [str(i) for i in range(torch.cuda.device_count())]
+
+def run_shard(shard, device, jobs, args, decode_workers, results_queue):
+    """Worker process: run one shard of the jobs on a single GPU"""
+    # Must be set before torch initializes CUDA in this process
+    os.environ["CUDA_VISIBLE_DEVICES"] = device
+    setup_logging(quiet=args.quiet)
+    
+    if args.random_seed is not None:
+        import torch
+        shard_seed = args.random_seed * SHARD_SEED_STRIDE + shard
+        random.seed(shard_seed)
+        torch.manual_seed(shard_seed)
+    
+    try:
+        process_jobs(jobs, args, load_pipeline(args, decode_workers),
+                     lambda results, lines=(): results_queue.put((shard, results, lines)))
+    finally:
+        results_queue.put((shard, None, None))
+
+def run_sharded(jobs, devices, args, report):
+    """Split the jobs into contiguous runs, one spawned worker per GPU,
+    passing their outcomes to report() as they arrive"""
+    import multiprocessing as mp
+    import queue
+    
+    # spawn, not fork: each worker must initialize CUDA on its own device
+    context = mp.get_context("spawn")
+    results_queue = context.Queue()
+    # The decode threads of all workers share the same pinned CPUs
+    decode_workers = max(1, (os.cpu_count() or 2) // 2 // len(devices))
+    
+    # Contiguous runs keep the audios of a template on one GPU, except where
+    # a run boundary falls inside its audios
+    bounds = [len(jobs) * shard // len(devices) for shard in range(len(devices) + 1)]
+    workers = []
+    for shard, device in enumerate(devices):
+        worker = context.Process(target=run_shard,
+                                 args=(shard, device, jobs[bounds[shard]:bounds[shard + 1]], args,
+                                       decode_workers, results_queue))
+        worker.start()
+        workers.append(worker)
+    
+    reported = [0] * len(workers)
+    finished = 0
+    while finished < len(workers):
+        flush_logs()
+        try:
+            shard, results, lines = results_queue.get(timeout=1.0)
+        except queue.Empty:
+            # A worker killed outright never sends its end marker
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        if results is None:
+            finished += 1
+        else:
+            reported[shard] += len(results)
+            report(results, lines)
+    
+    for shard, worker in enumerate(workers):
+        worker.join()
+        if worker.exitcode != 0:
+            log.error(f"GPU worker {shard} (device {devices[shard]}) exited with code {worker.exitcode}")
+        # Jobs of a worker that died (model load failure, OOM) count as failed
+        missing = bounds[shard + 1] - bounds[shard] - reported[shard]
+        if missing > 0:
+            report([False] * missing,
+                   [f"✗ GPU worker {shard} (device {devices[shard]}) did not finish "
+                    f"{missing} combinations"])
 
 def main():
     parser = argparse.ArgumentParser(description="Batch inference for LatentSync")
@@ -100,52 +365,74 @@ def main():
                        help="Guidance scale")
     parser.add_argument("--enable_deepcache", action="store_true", default=True,
                        help="Enable DeepCache for faster inference")
+    parser.add_argument("--disable_deepcache", action="store_false", dest="enable_deepcache",
+                       help="Disable DeepCache (required for --cuda_graphs)")
     parser.add_argument("--max_combinations", type=int, default=None,
                        help="Maximum number of video-audio combinations to process")
     parser.add_argument("--random_seed", type=int, default=None,
                        help="Random seed for reproducibility")
     parser.add_argument("--allow_repeat_videos", action="store_true", default=True,
                        help="Allow the same video to be selected multiple times")
+    parser.add_argument("--no_repeat_videos", action="store_false", dest="allow_repeat_videos",
+                       help="Use every video once before any video is reused")
+    parser.add_argument("--quiet", action="store_true", default=False,
+                       help="Only log failures and the final summary")
+    parser.add_argument("--subprocess", action="store_true", default=False,
+                       help="Run each combination in a separate scripts.inference process")
+    parser.add_argument("--encode_workers", type=int, default=2,
+                       help="Background workers writing finished videos (0 encodes inline)")
+    parser.add_argument("--cuda_graphs", action="store_true", default=False,
+                       help="Replay the UNet from CUDA graphs (in-process only, needs --disable_deepcache)")
+    parser.add_argument("--compile", action="store_true", default=False,
+                       help="Compile the UNet with torch.compile (in-process only, needs --disable_deepcache)")
+    parser.add_argument("--dtype", type=str, default="auto", choices=["auto", "fp16", "bf16", "fp32"],
+                       help="Weight precision of the UNet and VAE (in-process only; auto picks fp16 on Ampere+)")
+    parser.add_argument("--cache_dir", type=str, default=".cache",
+                       help="Directory for per-video caches reused across audios and runs")
+    parser.add_argument("--no_cache", action="store_true", default=False,
+                       help="Do not read or write the per-video caches")
+    parser.add_argument("--num_gpus", type=int, default=None,
+                       help="Number of GPUs to shard the combinations across (default: all visible)")
     
     args = parser.parse_args()
+    setup_logging(quiet=args.quiet)
     
     # Set random seed if provided
     if args.random_seed is not None:
+        # Imported here so --help and argument errors don't pay for torch
+        import torch
         random.seed(args.random_seed)
         torch.manual_seed(args.random_seed)
     
     # Get video and audio files
-    print("Scanning for video and audio files...")
+    log.info("Scanning for video and audio files...")
     video_files = get_video_files(args.video_dir)
     audio_files = get_audio_files(args.audio_dir)
     
-    print(f"Found {len(video_files)} video files:")
-    for video in video_files:
-        print(f"  - {Path(video).name}")
-    
-    print(f"Found {len(audio_files)} audio files:")
-    for audio in audio_files:
-        print(f"  - {Path(audio).name}")
+    progress_log.info("\n".join([f"Found {len(video_files)} video files:"]
+                                 + [f"  - {video.name}" for video in video_files]))
+    progress_log.info("\n".join([f"Found {len(audio_files)} audio files:"]
+                                 + [f"  - {audio.name}" for audio in audio_files]))
     
     if not video_files:
-        print("No video files found!")
+        log.error("No video files found!")
         return
     
     if not audio_files:
-        print("No audio files found!")
+        log.error("No audio files found!")
         return
     
     # Create output directory
     output_dir = create_output_dir(args.output_dir)
-    print(f"Output directory: {output_dir}")
+    log.info(f"Output directory: {output_dir}")
     
     # Calculate total combinations (one per audio file)
     total_combinations = len(audio_files)
     if args.max_combinations:
         total_combinations = min(total_combinations, args.max_combinations)
     
-    print(f"Total combinations to process: {total_combinations}")
-    print(f"Processing strategy: Randomly sample one video per audio file")
+    log.info(f"Total combinations to process: {total_combinations}\n"
+             f"Processing strategy: Randomly sample one video per audio file")
     
     # Process combinations - randomly sample video for each audio
     successful = 0
@@ -154,65 +441,53 @@ def main():
     
     combination_count = 0
     
-    # Create a list of audio files to process
-    audio_files_to_process = audio_files.copy()
-    
-    # If max_combinations is specified, limit the number of audio files to process
-    if args.max_combinations and args.max_combinations < len(audio_files):
-        audio_files_to_process = random.sample(audio_files, args.max_combinations)
+    # If max_combinations is specified, limit the number of audio files to
+    # process; audio_files is not modified, so it needs no copy otherwise
+    audio_files_to_process = (random.sample(audio_files, args.max_combinations)
+                              if args.max_combinations and args.max_combinations < len(audio_files)
+                              else audio_files)
     
     total_combinations = len(audio_files_to_process)
     
-    # Track used videos if we don't want repeats
-    used_videos = set()
+    # Without repeats, every video is used once per pass over a reshuffled list
+    video_cycle = shuffled_cycle(video_files)
     
+    # Sample a video for every audio up front so that audios sharing a
+    # template can be processed back to back
+    assignments = []
     for audio_file in audio_files_to_process:
         # Randomly sample a video file for this audio
-        if not args.allow_repeat_videos and len(used_videos) >= len(video_files):
-            print("Warning: All videos have been used. Reusing videos.")
-            used_videos.clear()
-        
         if args.allow_repeat_videos:
             sampled_video = random.choice(video_files)
         else:
-            available_videos = [v for v in video_files if v not in used_videos]
-            if not available_videos:
-                print("Warning: No more unique videos available. Reusing videos.")
-                used_videos.clear()
-                available_videos = video_files
-            sampled_video = random.choice(available_videos)
-            used_videos.add(sampled_video)
-        
-        combination_count += 1
+            sampled_video = next(video_cycle)
         
+        assignments.append((sampled_video, audio_file))
+    
+    assignments = group_by_video(assignments)
+    
+    # One stamp per run plus a running index keeps output names unique even
+    # when several outputs are produced within the same second
+    run_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # Output names and seeds are fixed here, before any sharding, so they do
+    # not depend on how many GPUs share the work
+    video_stems = {video: video.stem for video in video_files}
+    audio_stems = {audio: audio.stem for audio in audio_files_to_process}
+    jobs = []
+    for number, (sampled_video, audio_file) in enumerate(assignments, 1):
         # Create output filename
-        video_name = Path(sampled_video).stem
-        audio_name = Path(audio_file).stem
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"{video_name}_{audio_name}_{timestamp}.mp4"
-        output_path = output_dir / output_filename
-        
-        print(f"\n[{combination_count}/{total_combinations}] Processing combination...")
-        print(f"  Audio: {Path(audio_file).name}")
-        print(f"  Randomly selected video: {Path(sampled_video).name}")
-        
-        # Run inference
-        success = run_inference(
-            video_path=sampled_video,
-            audio_path=audio_file,
-            output_path=str(output_path),
-            config_path=args.config_path,
-            ckpt_path=args.ckpt_path,
-            inference_steps=args.inference_steps,
-            guidance_scale=args.guidance_scale,
-            seed=args.random_seed,
-            enable_deepcache=args.enable_deepcache
-        )
-        
-        if success:
-            successful += 1
-        else:
-            failed += 1
+        output_filename = (f"{video_stems[sampled_video]}_{audio_stems[audio_file]}_{run_stamp}_"
+                           f"{number:05d}.mp4")
+        seed = args.random_seed if args.random_seed is not None else random.randint(1, 999999)
+        jobs.append((sampled_video, audio_file, output_dir / output_filename, seed,
+                     f"[{number}/{total_combinations}]"))
+    
+    def record(results, lines=()):
+        nonlocal combination_count, successful, failed
+        combination_count += len(results)
+        successful += sum(results)
+        failed += len(results) - sum(results)
         
         # Progress update
         elapsed_time = time.time() - start_time
@@ -220,25 +495,42 @@ def main():
         remaining_combinations = total_combinations - combination_count
         estimated_remaining_time = remaining_combinations * avg_time_per_combination
         
-        print(f"Progress: {combination_count}/{total_combinations} "
-              f"({combination_count/total_combinations*100:.1f}%)")
-        print(f"Successful: {successful}, Failed: {failed}")
-        print(f"Elapsed time: {elapsed_time/60:.1f} minutes")
-        print(f"Estimated remaining time: {estimated_remaining_time/60:.1f} minutes")
+        # One message per report, at warning level when it includes a failure
+        level = logging.INFO if all(results) else logging.WARNING
+        progress_log.log(level, "\n".join([
+            *lines,
+            f"Progress: {combination_count}/{total_combinations} "
+            f"({combination_count/total_combinations*100:.1f}%)",
+            f"Successful: {successful}, Failed: {failed}",
+            f"Elapsed time: {elapsed_time/60:.1f} minutes",
+            f"Estimated remaining time: {estimated_remaining_time/60:.1f} minutes",
+        ]))
+    
+    # One worker process per GPU, each with its own resident pipeline
+    devices = visible_devices()[:args.num_gpus]
+    num_shards = min(len(devices), len(jobs))
+    if num_shards > 1:
+        log.info(f"Sharding {total_combinations} combinations across {num_shards} GPUs: "
+                 f"{', '.join(devices[:num_shards])}")
+        run_sharded(jobs, devices[:num_shards], args, record)
+    else:
+        process_jobs(jobs, args, load_pipeline(args), record)
     
     # Final summary
     total_time = time.time() - start_time
-    print(f"\n{'='*50}")
-    print(f"BATCH INFERENCE COMPLETED")
-    print(f"{'='*50}")
-    print(f"Total combinations processed: {combination_count}")
-    print(f"Successful: {successful}")
-    print(f"Failed: {failed}")
-    print(f"Success rate: {successful/combination_count*100:.1f}%")
-    print(f"Total time: {total_time/60:.1f} minutes")
-    print(f"Average time per combination: {total_time/combination_count:.1f} seconds")
-    print(f"Output directory: {output_dir}")
-    print(f"{'='*50}")
+    success_rate = successful / combination_count * 100 if combination_count else 0.0
+    average_time = total_time / combination_count if combination_count else 0.0
+    log.info(f"\n{'='*50}\n"
+             f"BATCH INFERENCE COMPLETED\n"
+             f"{'='*50}\n"
+             f"Total combinations processed: {combination_count}\n"
+             f"Successful: {successful}\n"
+             f"Failed: {failed}\n"
+             f"Success rate: {success_rate:.1f}%\n"
+             f"Total time: {total_time/60:.1f} minutes\n"
+             f"Average time per combination: {average_time:.1f} seconds\n"
+             f"Output directory: {output_dir}\n"
+             f"{'='*50}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
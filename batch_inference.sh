@@ -60,6 +60,10 @@ while [[ $# -gt 0 ]]; do
             ALLOW_REPEAT_VIDEOS="--allow_repeat_videos"
             shift
             ;;
+        --no_repeat_videos)
+            ALLOW_REPEAT_VIDEOS="--no_repeat_videos"
+            shift
+            ;;
         --help)
             echo "Usage: $0 [OPTIONS]"
             echo ""
@@ -74,6 +78,7 @@ while [[ $# -gt 0 ]]; do
             echo "  --max_combinations N     Maximum number of combinations to process"
             echo "  --random_seed N          Random seed for reproducibility"
             echo "  --allow_repeat_videos    Allow same video to be selected multiple times"
+            echo "  --no_repeat_videos       Use every video once before any video is reused"
             echo "  --help                   Show this help message"
             echo ""
             echo "Examples:"
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+In-process LatentSync pipeline for batch inference
+Loads the models once and reuses them for every video-audio pair,
+instead of paying the import/checkpoint/CUDA setup cost per combination
+"""
+
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+log = logging.getLogger(__name__)
+
+# Number of upcoming template videos decoded ahead of the GPU stage
+PREFETCH_DEPTH = 2
+
+# Frames decoded per torchcodec call; each batch is moved to host memory
+# before the next, bounding the decoder's device memory per template
+DECODE_BATCH_FRAMES = 64
+
+# Characters that make a command string depend on the shell (expansion,
+# globbing, quoting, redirection, control operators)
+SHELL_METACHARACTERS = set("$`*?[]~'\"\\<>|&;(){}!#\n")
+
+
+def build_pipeline(config_path, ckpt_path, enable_deepcache=True,
+                   decode_workers=None, encode_workers=2, cuda_graphs=False,
+                   cache_dir=None, dtype="auto", compile_unet=False):
+    """Load the LatentSync models once and return a reusable pipeline"""
+    return InferencePipeline(config_path, ckpt_path, enable_deepcache=enable_deepcache,
+                             decode_workers=decode_workers, encode_workers=encode_workers,
+                             cuda_graphs=cuda_graphs, cache_dir=cache_dir, dtype=dtype,
+                             compile_unet=compile_unet)
+
+
+def decode_video(video_path, fps=25):
+    """Decode a video to RGB frames at the pipeline frame rate
+
+    Uses torchcodec (NVDEC when CUDA is available) to sample the frames
+    shown at each output timestamp directly. A failed GPU decode (codec or
+    profile NVDEC cannot handle, no free decoder sessions, CPU-only build)
+    is retried on the CPU, and ffmpeg resampling is the last resort
+    """
+    try:
+        from torchcodec.decoders import VideoDecoder
+    except ImportError:
+        return _decode_video_ffmpeg(video_path, fps)
+    import torch
+
+    devices = ["cuda", "cpu"] if torch.cuda.is_available() else ["cpu"]
+    for device in devices:
+        try:
+            return _decode_video_torchcodec(VideoDecoder, video_path, fps, device)
+        except Exception as e:
+            log.warning(f"Warning: torchcodec could not decode {Path(video_path).name} "
+                        f"on {device} ({e})")
+    return _decode_video_ffmpeg(video_path, fps)
+
+
+def _decode_video_torchcodec(decoder_type, video_path, fps, device):
+    import numpy as np
+
+    decoder = decoder_type(str(video_path), device=device)
+    begin = decoder.metadata.begin_stream_seconds
+    end = decoder.metadata.end_stream_seconds
+    # The stream covers [begin, end); rounding may put the last timestamp at end
+    num_frames = max(1, round((end - begin) * fps))
+    timestamps = [t for t in (begin + i / fps for i in range(num_frames)) if t < end]
+    # Face alignment and compositing run on host frames in NHWC layout
+    frames = np.empty((len(timestamps), decoder.metadata.height, decoder.metadata.width, 3),
+                      dtype=np.uint8)
+    for start in range(0, len(timestamps), DECODE_BATCH_FRAMES):
+        batch = decoder.get_frames_played_at(
+            seconds=timestamps[start:start + DECODE_BATCH_FRAMES]).data
+        frames[start:start + len(batch)] = batch.permute(0, 2, 3, 1).cpu().numpy()
+    return frames
+
+
+def _decode_video_ffmpeg(video_path, fps=25):
+    """Resample a video to the pipeline frame rate and decode it to RGB frames"""
+    import cv2
+    import numpy as np
+
+    temp_dir = tempfile.mkdtemp(prefix="latentsync_decode_")
+    try:
+        resampled_path = os.path.join(temp_dir, "video.mp4")
+        subprocess.run(
+            [shutil.which("ffmpeg") or "ffmpeg", "-loglevel", "error", "-y", "-nostdin",
+             "-i", str(video_path), "-r", str(fps), "-crf", "18", resampled_path],
+            check=True, close_fds=False,
+        )
+
+        frames = []
+        capture = cv2.VideoCapture(resampled_path)
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        capture.release()
+        return np.array(frames)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _remove_temp_dir(temp_dir):
+    """Remove a per-job temp dir"""
+    # The shared parent is left to close(): removing it here could race
+    # with the next job creating its own temp dir inside it
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _pin_decode_worker():
+    """Pin a decode thread to the upper half of the CPUs, away from the GPU feeder"""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) > 1:
+        os.sched_setaffinity(0, cpus[len(cpus) // 2:])
+
+
+def _shell_free_argv(command):
+    """Split a shell command string into argv, or None if it needs a shell
+
+    Only plain words separated by whitespace are rewritten; anything the
+    shell would expand, glob, unquote or redirect keeps running through it
+    """
+    if SHELL_METACHARACTERS.intersection(command):
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ""
+    try:
+        argv = list(lexer)
+    except ValueError:
+        return None
+    if not argv or any(SHELL_METACHARACTERS.intersection(token) for token in argv):
+        return None
+    # A leading NAME=value sets an environment variable for the command
+    if "=" in argv[0]:
+        return None
+    return argv
+
+
+def _spawn_friendly(args, kwargs):
+    """Rewrite a subprocess.run call so CPython can start it with posix_spawn
+
+    fork() would copy the page tables of a process holding the models and a
+    CUDA context; posix_spawn is only used for an argv with a full executable
+    path, no shell and close_fds=False (our own fds are non-inheritable anyway)
+    """
+    args = list(args)
+    kwargs = dict(kwargs)
+    command = args[0] if args else kwargs.get("args")
+    if kwargs.get("shell") and isinstance(command, str):
+        argv = _shell_free_argv(command)
+        if argv is not None:
+            command = argv
+            kwargs["shell"] = False
+    if not kwargs.get("shell") and not isinstance(command, (str, bytes)):
+        command = list(command)
+        command[0] = shutil.which(command[0]) or command[0]
+    if args:
+        args[0] = command
+    else:
+        kwargs["args"] = command
+    kwargs.setdefault("close_fds", False)
+    return args, kwargs
+
+
+class _DeferredSubprocess:
+    """Stand-in for the subprocess module that records run() calls for the encode stage"""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def run(self, *args, **kwargs):
+        args, kwargs = _spawn_friendly(args, kwargs)
+        if self._owner._encode_ops is None:
+            return subprocess.run(*args, **kwargs)
+        self._owner._encode_ops.append((subprocess.run, args, kwargs))
+        return subprocess.CompletedProcess(args[0] if args else kwargs.get("args"), 0)
+
+    def __getattr__(self, name):
+        return getattr(subprocess, name)
+
+
+class InferencePipeline:
+    """LatentSync models kept resident on the GPU across calls"""
+
+    def __init__(self, config_path, ckpt_path, enable_deepcache=True,
+                 decode_workers=None, encode_workers=2, cuda_graphs=False,
+                 cache_dir=None, dtype="auto", compile_unet=False):
+        # Imported here so the driver can fall back to the subprocess path
+        # when the LatentSync package is not importable
+        import torch
+        from omegaconf import OmegaConf
+        from diffusers import AutoencoderKL, DDIMScheduler
+        try:
+            from diffusers.models.autoencoders.vae import DiagonalGaussianDistribution
+        except ImportError:
+            from diffusers.models.vae import DiagonalGaussianDistribution
+        from latentsync.models.unet import UNet3DConditionModel
+        from latentsync.pipelines.lipsync_pipeline import LipsyncPipeline
+        from latentsync.whisper.audio2feature import Audio2Feature
+
+        self.torch = torch
+        self.config = OmegaConf.load(config_path)
+
+        if dtype == "auto":
+            is_fp16_supported = torch.cuda.is_available() and torch.cuda.get_device_capability()[0] > 7
+            self.dtype = torch.float16 if is_fp16_supported else torch.float32
+        else:
+            self.dtype = {"fp16": torch.float16, "bf16": torch.bfloat16, "fp32": torch.float32}[dtype]
+
+        scheduler = DDIMScheduler.from_pretrained("configs")
+
+        if self.config.model.cross_attention_dim == 768:
+            self.whisper_model_path = "checkpoints/whisper/small.pt"
+        elif self.config.model.cross_attention_dim == 384:
+            self.whisper_model_path = "checkpoints/whisper/tiny.pt"
+        else:
+            raise NotImplementedError("cross_attention_dim must be 768 or 384")
+
+        audio_encoder = Audio2Feature(
+            model_path=self.whisper_model_path,
+            device="cuda",
+            num_frames=self.config.data.num_frames,
+            audio_feat_length=self.config.data.audio_feat_length,
+        )
+
+        vae = AutoencoderKL.from_pretrained("stabilityai/sd-vae-ft-mse", torch_dtype=self.dtype)
+        vae.config.scaling_factor = 0.18215
+        vae.config.shift_factor = 0
+        # Decode frames in slices to bound peak VRAM on long clips
+        vae.enable_slicing()
+
+        denoising_unet, _ = UNet3DConditionModel.from_pretrained(
+            OmegaConf.to_container(self.config.model),
+            ckpt_path,
+            device="cpu",
+        )
+        denoising_unet = denoising_unet.to(dtype=self.dtype)
+        # The UNet's inflated 3D convolutions run as 2D convolutions over
+        # (batch * frames), so the 4D channels-last layout is the one that applies
+        try:
+            denoising_unet = denoising_unet.to(memory_format=torch.channels_last)
+        except RuntimeError as e:
+            log.warning(f"Warning: Could not convert the UNet to channels-last ({e})")
+
+        self.pipeline = LipsyncPipeline(
+            vae=vae,
+            audio_encoder=audio_encoder,
+            denoising_unet=denoising_unet,
+            scheduler=scheduler,
+        ).to("cuda")
+
+        if enable_deepcache:
+            from DeepCache import DeepCacheSDHelper
+
+            helper = DeepCacheSDHelper(pipe=self.pipeline)
+            helper.set_params(cache_interval=3, cache_branch_id=0)
+            helper.enable()
+
+        # DeepCache swaps UNet branches between steps, which a compiled or
+        # captured graph would freeze, so both need DeepCache disabled. The
+        # first clip pays the compilation for each UNet input shape; faces
+        # are aligned to the config resolution, so template size does not matter
+        if compile_unet and enable_deepcache:
+            log.warning("Warning: torch.compile is not compatible with DeepCache, running the UNet eagerly")
+        elif compile_unet:
+            from batch_cuda import compile_unet as compile_denoising_unet
+
+            compile_denoising_unet(self.pipeline.denoising_unet, cuda_graphs=cuda_graphs)
+
+        self.graphed_unet = None
+        if cuda_graphs and enable_deepcache:
+            log.warning("Warning: CUDA graphs are not compatible with DeepCache, running the UNet eagerly")
+        elif cuda_graphs:
+            from batch_cuda import CUDAGraphUNet
+
+            self.graphed_unet = CUDAGraphUNet(self.pipeline.denoising_unet)
+            self.graphed_unet.install()
+
+        # Stage A decodes upcoming template videos on the CPU, stage C writes
+        # and muxes finished videos, both overlapping the GPU stage
+        self._decode_pool = ThreadPoolExecutor(
+            max_workers=decode_workers or max(1, (os.cpu_count() or 2) // 2),
+            thread_name_prefix="decode",
+            initializer=_pin_decode_worker,
+        )
+        self._encode_pool = None
+        self._pending_encodes = deque()
+        self._max_pending_encodes = 2 * (encode_workers or 1)
+        if encode_workers:
+            self._encode_pool = ThreadPoolExecutor(max_workers=encode_workers,
+                                                   thread_name_prefix="encode")
+        self.prefetch_depth = PREFETCH_DEPTH
+        self._prefetched = OrderedDict()
+        self._encode_ops = None
+        self._temp_parents = set()
+        self._install_stage_hooks()
+
+        # Face detection and alignment depend only on the template video, so
+        # their results are cached on disk and shared by all of its audios
+        self.face_cache = None
+        self._current_video = None
+        self._current_frames = None
+        if cache_dir:
+            from batch_cache import FaceCache
+
+            self.face_cache = FaceCache(cache_dir, self.config.data.resolution)
+            self._affine_transform_video = self.pipeline.affine_transform_video
+            self.pipeline.affine_transform_video = self._affine_transform_cached
+
+        # Whisper features depend only on the audio file; they are extracted
+        # up front by prepare_audio_cache() and memory-mapped at use
+        self.audio_cache = None
+        if cache_dir:
+            from batch_cache import AudioFeatureCache
+
+            self.audio_cache = AudioFeatureCache(cache_dir, Path(self.whisper_model_path).stem)
+            self._audio2feat = self.pipeline.audio_encoder.audio2feat
+            self.pipeline.audio_encoder.audio2feat = self._audio2feat_cached
+
+        # VAE encodes of a template's face chunks repeat for every audio, so
+        # their posterior parameters are cached per video as well
+        self.latent_cache = None
+        if cache_dir:
+            from batch_cache import LatentCache
+
+            self.latent_cache = LatentCache(cache_dir, self.pipeline.vae)
+            self._posterior_type = DiagonalGaussianDistribution
+            self._vae_encode = self.pipeline.vae.encode
+            self.pipeline.vae.encode = self._vae_encode_cached
+
+    def _install_stage_hooks(self):
+        """Route the pipeline's video decode and final encode through the stage pools"""
+        from latentsync.pipelines import lipsync_pipeline
+
+        self._lipsync_module = lipsync_pipeline
+        self._read_video = lipsync_pipeline.read_video
+        lipsync_pipeline.read_video = self._read_prefetched
+
+        self._write_video = None
+        if (self._encode_pool is not None and hasattr(lipsync_pipeline, "write_video")
+                and hasattr(lipsync_pipeline, "subprocess")):
+            self._write_video = lipsync_pipeline.write_video
+            lipsync_pipeline.write_video = self._deferred_write_video
+            lipsync_pipeline.subprocess = _DeferredSubprocess(self)
+
+    def close(self):
+        """Wait for queued encodes and restore the pipeline hooks"""
+        self._decode_pool.shutdown(wait=True, cancel_futures=True)
+        if self._encode_pool is not None:
+            self._encode_pool.shutdown(wait=True)
+        for temp_parent in self._temp_parents:
+            try:
+                os.rmdir(temp_parent)
+            except OSError:
+                pass
+
+        if self.graphed_unet is not None:
+            self.graphed_unet.uninstall()
+        if self.face_cache is not None:
+            self.pipeline.affine_transform_video = self._affine_transform_video
+        if self.audio_cache is not None:
+            self.pipeline.audio_encoder.audio2feat = self._audio2feat
+        if self.latent_cache is not None:
+            self.latent_cache.flush()
+            self.pipeline.vae.encode = self._vae_encode
+        self._lipsync_module.read_video = self._read_video
+        if self._write_video is not None:
+            self._lipsync_module.write_video = self._write_video
+            self._lipsync_module.subprocess = subprocess
+
+    def prefetch(self, video_path):
+        """Start decoding a template video ahead of its GPU stage"""
+        key = str(video_path)
+        if key in self._prefetched:
+            self._prefetched.move_to_end(key)
+            return
+
+        self._prefetched[key] = self._decode_pool.submit(self._decode_and_preload, key)
+        # Keep the video being processed plus PREFETCH_DEPTH upcoming ones
+        while len(self._prefetched) > self.prefetch_depth + 1:
+            _, stale = self._prefetched.popitem(last=False)
+            stale.cancel()
+
+    def _decode_and_preload(self, video_path):
+        if self.face_cache is not None:
+            self.face_cache.preload(video_path)
+        return decode_video(video_path)
+
+    def _read_prefetched(self, video_path, *args, **kwargs):
+        future = self._prefetched.get(str(video_path))
+        if future is None or kwargs.get("change_fps") is False:
+            frames = self._read_video(video_path, *args, **kwargs)
+        else:
+            frames = future.result()
+        self._current_frames = frames
+        return frames
+
+    def _deferred_write_video(self, *args, **kwargs):
+        if self._encode_ops is None:
+            return self._write_video(*args, **kwargs)
+        self._encode_ops.append((self._write_video, args, kwargs))
+
+    def _affine_transform_cached(self, video_frames):
+        cached = self.face_cache.load(self._current_video, len(video_frames))
+        if cached is not None:
+            return cached
+
+        # Upstream aligns only the frames an audio needs, a prefix of the
+        # template; align the whole template once so every later audio hits
+        frames = self._current_frames
+        if frames is None or len(frames) < len(video_frames):
+            frames = video_frames
+        faces, boxes, affine_matrices = self._affine_transform_video(frames)
+        self.face_cache.save(self._current_video, faces, boxes, affine_matrices)
+        num_frames = len(video_frames)
+        return faces[:num_frames], boxes[:num_frames], affine_matrices[:num_frames]
+
+    def prepare_audio_cache(self, audio_paths):
+        """Extract and cache the Whisper features of every audio not cached yet
+
+        Audios that fail to load are skipped here; their combinations fail
+        on their own when the pipeline tries to extract them again.
+        Returns the numbers of audio files extracted and skipped
+        """
+        if self.audio_cache is None:
+            return 0, 0
+
+        missing = [audio_path for audio_path in audio_paths
+                   if self.audio_cache.get(audio_path) is None]
+        extracted = 0
+        for audio_path in missing:
+            try:
+                features = self._audio2feat(str(audio_path))
+            except Exception as e:
+                log.warning(f"Warning: Could not extract audio features of {Path(audio_path).name} ({e})")
+                continue
+            self.audio_cache.put(audio_path, features.cpu().numpy())
+            extracted += 1
+        self.audio_cache.flush()
+        return extracted, len(missing) - extracted
+
+    def _audio2feat_cached(self, audio_path):
+        # Always a CPU tensor, like upstream, whether or not the cache hit
+        features = self.audio_cache.get(audio_path)
+        if features is None:
+            features = self._audio2feat(audio_path).cpu().numpy()
+            self.audio_cache.put(audio_path, features)
+            self.audio_cache.flush()
+        return self.torch.from_numpy(features)
+
+    def _vae_encode_cached(self, images, *args, **kwargs):
+        if args or kwargs:
+            return self._vae_encode(images, *args, **kwargs)
+
+        parameters = self.latent_cache.get(images)
+        if parameters is not None:
+            return SimpleNamespace(latent_dist=self._posterior_type(parameters))
+
+        output = self._vae_encode(images)
+        self.latent_cache.put(images, output.latent_dist.parameters)
+        return output
+
+    def _encode(self, encode_ops, output_path, temp_dir):
+        try:
+            for func, args, kwargs in encode_ops:
+                func(*args, **kwargs)
+            if not Path(output_path).exists():
+                raise RuntimeError(f"ffmpeg did not produce {output_path}")
+        finally:
+            _remove_temp_dir(temp_dir)
+
+    def submit(self, video_path, audio_path, output_path, seed,
+               inference_steps=20, guidance_scale=1.5):
+        """Run the GPU stage for one pair and queue its encode stage
+
+        Returns a future that resolves once the output video has been written
+        """
+        # Each clip draws its noise from its own generator, so its output
+        # depends only on (video, audio, seed) and not on what ran before it;
+        # the scheduler timesteps are re-initialized by the pipeline itself
+        generator = self.torch.Generator(device="cuda")
+        generator.manual_seed(seed)
+        # No-op when the driver already prefetched this template
+        self.prefetch(video_path)
+
+        temp_dir = os.path.join(Path(output_path).parent, ".tmp", Path(output_path).stem)
+        self._temp_parents.add(os.path.dirname(temp_dir))
+        encode_ops = [] if self._write_video is not None else None
+
+        self._encode_ops = encode_ops
+        self._current_video = video_path
+        self._current_frames = None
+        try:
+            if self.latent_cache is not None:
+                self.latent_cache.open(video_path)
+            self.pipeline(
+                video_path=str(video_path),
+                audio_path=str(audio_path),
+                video_out_path=str(output_path),
+                num_frames=self.config.data.num_frames,
+                num_inference_steps=inference_steps,
+                guidance_scale=guidance_scale,
+                weight_dtype=self.dtype,
+                width=self.config.data.resolution,
+                height=self.config.data.resolution,
+                mask_image_path=self.config.data.mask_image_path,
+                temp_dir=temp_dir,
+                generator=generator,
+            )
+        except Exception as e:
+            _remove_temp_dir(temp_dir)
+            future = Future()
+            future.set_exception(e)
+            return future
+        finally:
+            self._encode_ops = None
+
+        if encode_ops is None:
+            _remove_temp_dir(temp_dir)
+            future = Future()
+            future.set_result(None)
+            return future
+
+        # Bound the encode queue so decoded output frames cannot pile up in
+        # memory when the GPU stage outpaces the encoders
+        while len(self._pending_encodes) >= self._max_pending_encodes:
+            self._pending_encodes.popleft().exception()
+        future = self._encode_pool.submit(self._encode, encode_ops, output_path, temp_dir)
+        self._pending_encodes.append(future)
+        return future